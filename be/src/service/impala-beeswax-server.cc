@@ -403,6 +403,53 @@ void ImpalaServer::CloseInsert(TInsertResult& insert_result,
 void ImpalaServer::PingImpalaService() {
 }
 
+QueryState::type ImpalaServer::WaitForFinished(const QueryHandle& handle,
+    const int32_t timeout_ms) {
+  if (handle.id == NO_QUERY_HANDLE) {
+    return QueryState::FINISHED;
+  }
+
+  TUniqueId query_id;
+  QueryHandleToTUniqueId(handle, &query_id);
+  VLOG_ROW << "WaitForFinished(): query_id=" << PrintId(query_id)
+           << " timeout_ms=" << timeout_ms;
+
+  shared_ptr<QueryExecState> exec_state = GetQueryExecState(query_id, false);
+  if (exec_state.get() == NULL) {
+    VLOG_QUERY << "ImpalaServer::WaitForFinished invalid handle";
+    RaiseBeeswaxException("Invalid query handle", SQLSTATE_GENERAL_ERROR);
+  }
+  return exec_state->WaitForFinished(timeout_ms);
+}
+
+void ImpalaServer::Finalize(string& log, const QueryHandle& handle,
+    const TFinalizeAction::type action) {
+  // Queries without a handle (e.g. USE) have nothing to clean up
+  if (handle.id == NO_QUERY_HANDLE) {
+    return;
+  }
+
+  TUniqueId query_id;
+  QueryHandleToTUniqueId(handle, &query_id);
+  VLOG_QUERY << "Finalize(): query_id=" << PrintId(query_id) << " action=" << action;
+  switch (action) {
+    case TFinalizeAction::CLOSE:
+      close(handle);
+      break;
+    case TFinalizeAction::CANCEL: {
+      impala::TStatus status;
+      Cancel(status, handle);
+      break;
+    }
+    case TFinalizeAction::GET_LOG_AND_CLOSE:
+      get_log(log, handle.log_context);
+      close(handle);
+      break;
+    default:
+      RaiseBeeswaxException("Unknown finalize action", SQLSTATE_GENERAL_ERROR);
+  }
+}
+
 void ImpalaServer::SessionStart(const ThriftServer::SessionKey& session_key) {
   lock_guard<mutex> l(session_state_map_lock_);
 
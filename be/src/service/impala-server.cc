@@ -192,12 +192,14 @@ Status ImpalaServer::QueryExecState::FetchRows(const int32_t max_rows,
   if (!query_status_.ok()) {
     query_state_ = QueryState::EXCEPTION;
   }
+  query_state_cv_.notify_all();
   return query_status_;
 }
 
 void ImpalaServer::QueryExecState::UpdateQueryState(QueryState::type query_state) {
   lock_guard<mutex> l(lock_);
   if (query_state_ < query_state) query_state_ = query_state;
+  query_state_cv_.notify_all();
 }
 
 void ImpalaServer::QueryExecState::SetErrorStatus(const Status& status) {
@@ -205,6 +207,18 @@ void ImpalaServer::QueryExecState::SetErrorStatus(const Status& status) {
   lock_guard<mutex> l(lock_);
   query_state_ = QueryState::EXCEPTION;
   query_status_ = status;
+  query_state_cv_.notify_all();
+}
+
+QueryState::type ImpalaServer::QueryExecState::WaitForFinished(int32_t timeout_ms) {
+  unique_lock<mutex> l(lock_);
+  system_time deadline =
+      get_system_time() + posix_time::milliseconds(max(timeout_ms, 0));
+  // Loop protects against spurious wakeup.
+  while (query_state_ != QueryState::FINISHED && query_state_ != QueryState::EXCEPTION) {
+    if (!query_state_cv_.timed_wait(l, deadline)) break;
+  }
+  return query_state_;
 }
 
 Status ImpalaServer::QueryExecState::FetchRowsInternal(const int32_t max_rows,
@@ -278,6 +292,7 @@ void ImpalaServer::QueryExecState::Cancel() {
   // Coordinator::Cancel() multiple times
   if (query_state_ == QueryState::EXCEPTION) return;
   query_state_ = QueryState::EXCEPTION;
+  query_state_cv_.notify_all();
   if (coord_.get() != NULL) coord_->Cancel();
 }
 
@@ -20,6 +20,7 @@
 
 #include "util/uid-util.h"  // for some reason needed right here for hash<TUniqueId>
 #include <boost/thread/mutex.hpp>
+#include <boost/thread/condition_variable.hpp>
 #include <boost/shared_ptr.hpp>
 #include <boost/scoped_ptr.hpp>
 #include <boost/unordered_map.hpp>
@@ -123,6 +124,10 @@ class ImpalaServer : public ImpalaServiceIf, public ImpalaHiveServer2ServiceIf,
   virtual void CloseInsert(impala::TInsertResult& insert_result,
       const beeswax::QueryHandle& query_handle);
   virtual void PingImpalaService();
+  virtual beeswax::QueryState::type WaitForFinished(
+      const beeswax::QueryHandle& handle, const int32_t timeout_ms);
+  virtual void Finalize(std::string& log, const beeswax::QueryHandle& handle,
+      const TFinalizeAction::type action);
 
   // ImpalaHiveServer2Service rpcs: HiveServer2 API (implemented in impala-hs2-server.cc)
   virtual void OpenSession(
@@ -295,6 +300,11 @@ class ImpalaServer : public ImpalaServiceIf, public ImpalaHiveServer2ServiceIf,
     // Caller needs to hold lock().
     void Cancel();
 
+    // Blocks until query_state_ is FINISHED or EXCEPTION, or until timeout_ms
+    // milliseconds have elapsed. Returns the query state at that point.
+    // Caller must *not* hold lock().
+    beeswax::QueryState::type WaitForFinished(int32_t timeout_ms);
+
     bool eos() { return eos_; }
     Coordinator* coord() const { return coord_.get(); }
     int num_rows_fetched() const { return num_rows_fetched_; }
@@ -329,6 +339,8 @@ class ImpalaServer : public ImpalaServiceIf, public ImpalaHiveServer2ServiceIf,
     vector<Expr*> output_exprs_;
     bool eos_;  // if true, there are no more rows to return
     beeswax::QueryState::type query_state_;
+    // Signalled whenever query_state_ may have moved to FINISHED or EXCEPTION
+    boost::condition_variable query_state_cv_;
     Status query_status_;
     TExecRequest exec_request_;
 
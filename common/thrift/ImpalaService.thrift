@@ -93,6 +93,18 @@ struct TInsertResult {
   1: required map<string, i64> rows_appended
 }
 
+// Cleanup actions performed by ImpalaService.Finalize()
+enum TFinalizeAction {
+  // Close the query handle
+  CLOSE,
+
+  // Cancel execution of the query; the handle remains open
+  CANCEL,
+
+  // Return the query's error log, then close the query handle
+  GET_LOG_AND_CLOSE,
+}
+
 // For all rpc that return a TStatus as part of their result type,
 // if the status_code field is set to anything other than OK, the contents
 // of the remainder of the result type is undefined (typically not set)
@@ -115,6 +127,18 @@ service ImpalaService extends beeswax.BeeswaxService {
       
   // Client calls this RPC to verify that the server is an ImpalaService.
   void PingImpalaService();
+
+  // Blocks until the query reaches FINISHED or EXCEPTION, or until timeout_ms
+  // milliseconds have elapsed, and returns the query state at that point.
+  // Lets clients wait for a query without polling get_state().
+  beeswax.QueryState WaitForFinished(1:beeswax.QueryHandle handle, 2:i32 timeout_ms)
+      throws(1:beeswax.BeeswaxException error);
+
+  // Performs the given cleanup action on the query in a single round-trip. Returns
+  // the query's error log for GET_LOG_AND_CLOSE, and an empty string otherwise.
+  // Throws BeeswaxException under the same conditions as close() and Cancel().
+  string Finalize(1:beeswax.QueryHandle handle, 2:TFinalizeAction action)
+      throws(1:beeswax.BeeswaxException error);
 }
 
 // Impala HiveServer2 service
@@ -16,17 +16,21 @@
 #
 # Impala's shell
 import cmd
+import errno
+import itertools
 import time
 import sys
 import os
+import random
 import signal
+import socket
 import threading
 from optparse import OptionParser
 
 from beeswaxd import BeeswaxService
 from beeswaxd.BeeswaxService import QueryState
 from ImpalaService import ImpalaService
-from ImpalaService.ImpalaService import TImpalaQueryOptions
+from ImpalaService.ImpalaService import TImpalaQueryOptions, TFinalizeAction
 from ImpalaService.constants import DEFAULT_QUERY_OPTIONS
 from Status.ttypes import TStatus, TStatusCode
 from thrift.transport.TSocket import TSocket
@@ -38,6 +42,19 @@ VERSION_FORMAT = "Impala v%(version)s (%(git_hash)s) built on %(build_date)s"
 COMMENT_TOKEN = '--'
 VERSION_STRING = "build version not available"
 HISTORY_LENGTH = 100
+# Query files are read and parsed in chunks of this many bytes
+QUERY_FILE_CHUNK_SIZE = 1 << 16
+# Sentinel query handle id that impalad answers without looking up a query
+NO_QUERY_HANDLE = 'no_query_handle'
+# Upper bound, in ms, on how long a single WaitForFinished rpc blocks. The shell checks
+# for cancellation requests between calls, so this bounds Ctrl-C latency.
+WAIT_FOR_FINISHED_TIMEOUT_MS = 200
+# The first wait is shorter, so that short queries don't pay for a long rpc timeout
+INITIAL_WAIT_FOR_FINISHED_TIMEOUT_MS = 50
+# Bounds, in seconds, on the sleep between get_state polls for impalads that don't
+# support WaitForFinished
+MIN_POLL_INTERVAL = 0.01
+MAX_POLL_INTERVAL = 1.0
 
 # Tarball / packaging build makes impala_build_version available
 try:
@@ -69,7 +86,7 @@ class RpcStatus:
 class ImpalaShell(cmd.Cmd):
   DISCONNECTED_PROMPT = "[Not connected] > "
 
-  def __init__(self, options):
+  def __init__(self, options, interactive=False):
     cmd.Cmd.__init__(self)
     self.is_alive = True
     self.use_kerberos = options.use_kerberos
@@ -80,16 +97,42 @@ class ImpalaShell(cmd.Cmd):
     self.connected = False
     self.imp_service = None
     self.transport = None
-    self.fetch_batch_size = 1024
+    # Bound rpc methods of imp_service, set on connect.
+    self.rpc_query = None
+    self.rpc_fetch = None
+    self.rpc_get_state = None
+    self.rpc_wait_for_finished = None
+    self.rpc_close = None
+    self.rpc_cancel = None
+    self.rpc_get_log = None
+    self.rpc_close_insert = None
+    self.rpc_explain = None
+    self.rpc_reset_catalog = None
+    self.rpc_finalize = None
+    self.supports_wait_for_finished = False
+    self.supports_finalize = False
+    self.fetch_batch_size = 8192
     self.query_options = {}
     self.__make_default_options()
     self.query_state = QueryState._NAMES_TO_VALUES
+    # Maps each query option name to itself, so that SET can validate an option and
+    # get the canonical copy of its name in a single lookup.
+    self.option_names = \
+        dict((name, name) for name in TImpalaQueryOptions._NAMES_TO_VALUES)
     self.refresh_after_connect = options.refresh_after_connect
     self.default_db = options.default_db
     self.history_file = os.path.expanduser("~/.impalahistory")
+    self.history_thread = None
+    self.history_error = None
     try:
       self.readline = __import__('readline')
       self.readline.set_history_length(HISTORY_LENGTH)
+      # Only the interactive shell uses the history. Load the history file in the
+      # background, e.g. while connecting to the impalad.
+      if interactive:
+        self.history_thread = threading.Thread(target=self.__load_history)
+        self.history_thread.daemon = True
+        self.history_thread.start()
     except ImportError:
       self.readline = None
     if options.impalad != None:
@@ -107,12 +150,18 @@ class ImpalaShell(cmd.Cmd):
     self.query_options = {}
     for option, default in DEFAULT_QUERY_OPTIONS.iteritems():
       self.query_options[self.__get_option_name(option)] = default
+    self.query_options_list = None
 
   def __print_options(self):
-    print '\n'.join(["\t%s: %s" % (k,v) for (k,v) in self.query_options.iteritems()])
+    print '\n'.join("\t%s: %s" % kv for kv in self.query_options.iteritems())
 
   def __options_to_string_list(self):
-    return ["%s=%s" % (k,v) for (k,v) in self.query_options.iteritems()]
+    """Returns the query options as a list of 'key=value' strings. The list is
+    cached until the options are changed with SET."""
+    if self.query_options_list is None:
+      self.query_options_list = \
+          ["%s=%s" % (k,v) for (k,v) in self.query_options.iteritems()]
+    return self.query_options_list
 
   def do_shell(self, args):
     """Run a command on the shell
@@ -131,14 +180,12 @@ class ImpalaShell(cmd.Cmd):
     # A command terminated by a semi-colon is legal. Check for the trailing
     # semi-colons and strip them from the end of the command.
     args = args.strip()
-    tokens = args.split(' ')
+    command, sep, rest = args.partition(' ')
     # The first token should be the command
     # If it's EOF, call do_quit()
-    if tokens[0] == 'EOF':
+    if command == 'EOF':
       return 'quit'
-    else:
-      tokens[0] = tokens[0].lower()
-    return ' '.join(tokens).rstrip(';')
+    return (command.lower() + sep + rest).rstrip(';')
 
   def __signal_handler(self, signal, frame):
     self.is_interrupted.set()
@@ -178,14 +225,14 @@ class ImpalaShell(cmd.Cmd):
     if len(tokens) != 2:
       print "Error: SET <option>=<value>"
       return False
-    option_upper = tokens[0].upper()
-    if option_upper not in ImpalaService.TImpalaQueryOptions._NAMES_TO_VALUES.keys():
+    option_upper = self.option_names.get(tokens[0].upper())
+    if option_upper is None:
       print "Unknown query option: %s" % (tokens[0],)
-      available_options = \
-          '\n\t'.join(ImpalaService.TImpalaQueryOptions._NAMES_TO_VALUES.keys())
+      available_options = '\n\t'.join(self.option_names)
       print "Available query options are: \n\t%s" % available_options
       return False
     self.query_options[option_upper] = tokens[1]
+    self.query_options_list = None
     self.__print_if_verbose('%s set to %s' % (option_upper, tokens[1]))
     return True
 
@@ -209,6 +256,9 @@ class ImpalaShell(cmd.Cmd):
       connection_params = tokens[0].split(':')
       if len(connection_params) > 1:
         host, port = connection_params
+        # Rejects a missing or non-numeric port (e.g. 'host:') here, rather than on
+        # every connection attempt.
+        port = int(port)
       else:
         host, port = connection_params[0], 21000
       self.impalad = (host, port)
@@ -236,8 +286,14 @@ class ImpalaShell(cmd.Cmd):
       self.transport.open()
       protocol = TBinaryProtocol.TBinaryProtocol(self.transport)
       self.imp_service = ImpalaService.Client(protocol)
+      self.__bind_rpcs()
       try:
         self.imp_service.PingImpalaService()
+        no_query = BeeswaxService.QueryHandle(id=NO_QUERY_HANDLE)
+        self.supports_wait_for_finished = \
+            self.__probe_rpc(self.rpc_wait_for_finished, no_query, 0)
+        self.supports_finalize = \
+            self.__probe_rpc(self.rpc_finalize, no_query, TFinalizeAction.CLOSE)
         self.connected = True
       except Exception, e:
         print ("Error: Unable to communicate with impalad service. This service may not "
@@ -249,40 +305,68 @@ class ImpalaShell(cmd.Cmd):
 
     return self.connected
 
+  def __bind_rpcs(self):
+    """Looks up the rpc methods of imp_service once per connection, rather than on
+    every call."""
+    self.rpc_query = self.imp_service.query
+    self.rpc_fetch = self.imp_service.fetch
+    self.rpc_get_state = self.imp_service.get_state
+    self.rpc_wait_for_finished = self.imp_service.WaitForFinished
+    self.rpc_close = self.imp_service.close
+    self.rpc_cancel = self.imp_service.Cancel
+    self.rpc_get_log = self.imp_service.get_log
+    self.rpc_close_insert = self.imp_service.CloseInsert
+    self.rpc_explain = self.imp_service.explain
+    self.rpc_reset_catalog = self.imp_service.ResetCatalog
+    self.rpc_finalize = self.imp_service.Finalize
+
+  def __probe_rpc(self, rpc, *args):
+    """Returns True if the impalad implements rpc, by calling it with args.
+
+       Older impalads reply with an unknown method error, in which case the shell
+       falls back to the rpcs they do support (e.g. polling get_state() instead of
+       WaitForFinished()).
+    """
+    try:
+      rpc(*args)
+    except TApplicationException, t:
+      if t.type == TApplicationException.UNKNOWN_METHOD:
+        return False
+      raise
+    return True
+
   def __get_transport(self):
     """Create a Transport.
 
        A non-kerberized impalad just needs a simple buffered transport. For
        the kerberized version, a sasl transport is created.
     """
-    sock = TSocket(self.impalad[0], int(self.impalad[1]))
+    host, port = self.impalad
+    sock = TSocket(host, port)
     if not self.use_kerberos:
       return TBufferedTransport(sock)
+    service_name = self.kerberos_service_name
     # Initializes a sasl client
     def sasl_factory():
-      sasl_client = sasl.Client()
-      sasl_client.setAttr("host", self.impalad[0])
-      sasl_client.setAttr("service", self.kerberos_service_name)
+      sasl_client = SaslClient()
+      sasl_client.setAttr("host", host)
+      sasl_client.setAttr("service", service_name)
       sasl_client.init()
       return sasl_client
     # GSSASPI is the underlying mechanism used by kerberos to authenticate.
     return TSaslClientTransport(sasl_factory, "GSSAPI", sock)
 
-  def __get_sleep_interval(self, start_time):
-    """Returns a step function of time to sleep in seconds before polling
-    again. Maximum sleep is 1s, minimum is 0.1s"""
-    elapsed = time.time() - start_time
-    if elapsed < 10.0:
-      return 0.1
-    elif elapsed < 60.0:
-      return 0.5
-
-    return 1.0
+  def __get_sleep_interval(self, last_interval):
+    """Returns the time to sleep in seconds before polling again: last_interval
+    backed off by a random factor of 1.25-1.75. Minimum sleep is 0.01s, maximum
+    is 1s."""
+    interval = last_interval * random.uniform(1.25, 1.75)
+    return max(MIN_POLL_INTERVAL, min(MAX_POLL_INTERVAL, interval))
 
   def __query_with_results(self, query):
     self.__print_if_verbose("Query: %s" % (query.query,))
     start, end = time.time(), 0
-    (handle, status) = self.__do_rpc(lambda: self.imp_service.query(query))
+    (handle, status) = self.__do_rpc(self.rpc_query, query)
 
     if self.is_interrupted.isSet():
       if status == RpcStatus.OK:
@@ -291,29 +375,37 @@ class ImpalaShell(cmd.Cmd):
     if status != RpcStatus.OK:
       return False
 
-    loop_start = time.time()
+    finished, exception = self.query_state["FINISHED"], self.query_state["EXCEPTION"]
+    wait_for_query_state = self.__wait_for_query_state
+    is_interrupted = self.is_interrupted.isSet
+    wait_timeout_ms = INITIAL_WAIT_FOR_FINISHED_TIMEOUT_MS
+    sleep_interval = 0
     while True:
-      query_state = self.__get_query_state(handle)
-      if query_state == self.query_state["FINISHED"]:
+      query_state = wait_for_query_state(handle, wait_timeout_ms)
+      if query_state == finished:
         break
-      elif query_state == self.query_state["EXCEPTION"]:
+      elif query_state == exception:
         print 'Query aborted, unable to fetch data'
         if self.connected:
           return self.__close_query_handle(handle)
         else:
           return False
-      elif self.is_interrupted.isSet():
+      elif is_interrupted():
         return self.__cancel_query(handle)
-      time.sleep(self.__get_sleep_interval(loop_start))
+      if self.supports_wait_for_finished:
+        wait_timeout_ms = WAIT_FOR_FINISHED_TIMEOUT_MS
+      else:
+        sleep_interval = self.__get_sleep_interval(sleep_interval)
+        time.sleep(sleep_interval)
 
     # Results are ready, fetch them till they're done.
     self.__print_if_verbose('Query finished, fetching results ...')
-    result_rows = []
+    write = sys.stdout.write
     num_rows_fetched = 0
     while True:
       # Fetch rows in batches of at most fetch_batch_size
-      (results, status) = self.__do_rpc(lambda: self.imp_service.fetch(
-                                                  handle, False, self.fetch_batch_size))
+      (results, status) = self.__do_rpc(
+          self.rpc_fetch, handle, False, self.fetch_batch_size)
 
       if self.is_interrupted.isSet() or status != RpcStatus.OK:
         # Worth trying to cleanup the query even if fetch failed
@@ -321,12 +413,18 @@ class ImpalaShell(cmd.Cmd):
           self.__close_query_handle(handle)
         return False
       num_rows_fetched += len(results.data)
-      result_rows.extend(results.data)
-      if len(result_rows) >= self.fetch_batch_size or not results.has_more:
-        print '\n'.join(result_rows)
-        result_rows = []
-        if not results.has_more:
-          break
+      # Stream each batch straight to the (already buffered) stdout.
+      if results.data:
+        write('\n'.join(results.data))
+        write('\n')
+      if not results.has_more:
+        break
+    if num_rows_fetched == 0:
+      # An empty result has always been printed as a blank line.
+      write('\n')
+    # Rows are only buffered per query; a reader of piped output shouldn't have to
+    # wait for the next query to see them.
+    sys.stdout.flush()
     end = time.time()
 
     self.__print_if_verbose(
@@ -335,40 +433,48 @@ class ImpalaShell(cmd.Cmd):
 
   def __close_query_handle(self, handle):
     """Close the query handle"""
-    self.__do_rpc(lambda: self.imp_service.close(handle))
+    self.__finalize_query(handle, TFinalizeAction.CLOSE)
     return True
 
+  def __finalize_query(self, handle, action):
+    """Performs the TFinalizeAction on the query in one Finalize rpc, or with the
+       equivalent close/Cancel/get_log rpcs if the impalad doesn't support Finalize.
+       Returns (log, status); log is only set for GET_LOG_AND_CLOSE.
+    """
+    if self.supports_finalize:
+      return self.__do_rpc(self.rpc_finalize, handle, action)
+    log = None
+    if action == TFinalizeAction.GET_LOG_AND_CLOSE:
+      log, _ = self.__do_rpc(self.rpc_get_log, handle.log_context)
+    if action == TFinalizeAction.CANCEL:
+      (_, status) = self.__do_rpc(self.rpc_cancel, handle)
+    else:
+      (_, status) = self.__do_rpc(self.rpc_close, handle)
+    return (log, status)
+
   def __print_if_verbose(self, message):
     if self.verbose:
       print message
 
-  def do_select(self, args):
-    """Executes a SELECT... query, fetching all rows"""
-    query = BeeswaxService.Query()
-    query.query = "select %s" % (args,)
-    query.configuration = self.__options_to_string_list()
-    return self.__query_with_results(query)
-
-  def do_use(self, args):
-    """Executes a USE... query"""
-    query = BeeswaxService.Query()
-    query.query = "use %s" % (args,)
-    query.configuration = self.__options_to_string_list()
-    return self.__query_with_results(query)
-
-  def do_show(self, args):
-    """Executes a SHOW... query, fetching all rows"""
-    query = BeeswaxService.Query()
-    query.query = "show %s" % (args,)
-    query.configuration = self.__options_to_string_list()
-    return self.__query_with_results(query)
-
-  def do_describe(self, args):
-    """Executes a DESCRIBE... query, fetching all rows"""
-    query = BeeswaxService.Query()
-    query.query = "describe %s" % (args,)
-    query.configuration = self.__options_to_string_list()
-    return self.__query_with_results(query)
+  def make_query_command(keyword, doc):
+    """Returns a do_<keyword> method that executes '<keyword> <args>' as a query and
+    prints its results. These commands only differ in their keyword."""
+    def do_query(self, args):
+      query = BeeswaxService.Query()
+      query.query = "%s %s" % (keyword, args)
+      query.configuration = self.__options_to_string_list()
+      return self.__query_with_results(query)
+    do_query.__name__ = 'do_%s' % keyword
+    do_query.__doc__ = doc
+    return do_query
+
+  do_select = make_query_command('select',
+      "Executes a SELECT... query, fetching all rows")
+  do_use = make_query_command('use', "Executes a USE... query")
+  do_show = make_query_command('show', "Executes a SHOW... query, fetching all rows")
+  do_describe = make_query_command('describe',
+      "Executes a DESCRIBE... query, fetching all rows")
+  del make_query_command
 
   def do_insert(self, args):
     """Executes an INSERT query"""
@@ -377,38 +483,47 @@ class ImpalaShell(cmd.Cmd):
     query.configuration = self.__options_to_string_list()
     print "Query: %s" % (query.query,)
     start, end = time.time(), 0
-    (handle, status) = self.__do_rpc(lambda: self.imp_service.query(query))
+    (handle, status) = self.__do_rpc(self.rpc_query, query)
 
     if status != RpcStatus.OK:
       return False
 
+    finished, exception = self.query_state["FINISHED"], self.query_state["EXCEPTION"]
+    wait_for_query_state = self.__wait_for_query_state
+    is_interrupted = self.is_interrupted.isSet
+    wait_timeout_ms = INITIAL_WAIT_FOR_FINISHED_TIMEOUT_MS
+    sleep_interval = 0
     while True:
-      query_state = self.__get_query_state(handle)
-      if query_state == self.query_state["FINISHED"]:
+      query_state = wait_for_query_state(handle, wait_timeout_ms)
+      if query_state == finished:
         break
-      elif query_state == self.query_state["EXCEPTION"]:
+      elif query_state == exception:
         print 'Remote error'
         if self.connected:
-          # Retrieve error message (if any) from log.
-          log, status = self._ImpalaShell__do_rpc(
-            lambda: self.imp_service.get_log(handle.log_context))
-          print log,
+          # Retrieve error message (if any) from log, and close the query.
           # It's ok to close an INSERT that's failed rather than do the full
           # CloseInsert. The latter builds an InsertResult which is meaningless
           # here.
-          return self.__close_query_handle(handle)
+          log, status = self.__finalize_query(
+              handle, TFinalizeAction.GET_LOG_AND_CLOSE)
+          print log,
+          return True
         else:
           return False
-      elif self.is_interrupted.isSet():
+      elif is_interrupted():
         return self.__cancel_query(handle)
-      time.sleep(0.05)
+      if self.supports_wait_for_finished:
+        wait_timeout_ms = WAIT_FOR_FINISHED_TIMEOUT_MS
+      else:
+        sleep_interval = self.__get_sleep_interval(sleep_interval)
+        time.sleep(sleep_interval)
 
-    (insert_result, status) = self.__do_rpc(lambda: self.imp_service.CloseInsert(handle))
+    (insert_result, status) = self.__do_rpc(self.rpc_close_insert, handle)
     end = time.time()
     if status != RpcStatus.OK or self.is_interrupted.isSet():
       return False
 
-    num_rows = sum([int(k) for k in insert_result.rows_appended.values()])
+    num_rows = sum(int(k) for k in insert_result.rows_appended.itervalues())
     self.__print_if_verbose("Inserted %d rows in %2.2fs" % (num_rows, end - start))
     return True
 
@@ -417,20 +532,48 @@ class ImpalaShell(cmd.Cmd):
     print 'Cancelling query ...'
     # Cancel sets query_state to EXCEPTION before calling cancel() in the
     # co-ordinator, so we don't need to wait.
-    (_, status) = self.__do_rpc(lambda: self.imp_service.Cancel(handle))
+    (_, status) = self.__finalize_query(handle, TFinalizeAction.CANCEL)
     if status != RpcStatus.OK:
       return False
 
     return True
 
   def __get_query_state(self, handle):
-    state, status = self.__do_rpc(lambda : self.imp_service.get_state(handle))
+    state, status = self.__do_rpc(self.rpc_get_state, handle)
+    if status != RpcStatus.OK:
+      return self.query_state["EXCEPTION"]
+    return state
+
+  def __wait_for_query_state(self, handle, timeout_ms):
+    """Blocks for up to timeout_ms until the query is FINISHED or EXCEPTION, and
+       returns its state. If the impalad does not support WaitForFinished, returns
+       the current state immediately and the caller is expected to sleep between calls.
+    """
+    if not self.supports_wait_for_finished:
+      return self.__get_query_state(handle)
+    state, status = self.__do_rpc(self.__wait_for_finished, handle, timeout_ms)
     if status != RpcStatus.OK:
       return self.query_state["EXCEPTION"]
     return state
 
-  def __do_rpc(self, rpc):
-    """Executes the RPC lambda provided with some error checking. Returns
+  def __wait_for_finished(self, handle, timeout_ms):
+    """Calls WaitForFinished, tolerating one Ctrl-C while waiting for the reply.
+
+       The rpc is expected to block, so a Ctrl-C usually interrupts the socket read.
+       The impalad still sends its reply within timeout_ms, and that reply has to be
+       read before the connection can be used to cancel the query, so it is read
+       again. A second Ctrl-C fails the rpc, like an interrupt during any other rpc.
+    """
+    self.imp_service.send_WaitForFinished(handle, timeout_ms)
+    try:
+      return self.imp_service.recv_WaitForFinished()
+    except socket.error, e:
+      if e.args[0] != errno.EINTR:
+        raise
+      return self.imp_service.recv_WaitForFinished()
+
+  def __do_rpc(self, rpc, *args):
+    """Executes rpc(*args) with some error checking. Returns
        (rpc_result, RpcStatus.OK) if request was successful,
        (None, RpcStatus.ERROR) otherwise.
 
@@ -442,7 +585,7 @@ class ImpalaShell(cmd.Cmd):
       print "Not connected (use CONNECT to establish a connection)"
       return (None, RpcStatus.ERROR)
     try:
-      ret = rpc()
+      ret = rpc(*args)
       status = RpcStatus.OK
       # TODO: In the future more advanced error detection/handling can be done based on
       # the TStatus return value. For now, just print any error(s) that were encountered
@@ -478,7 +621,7 @@ class ImpalaShell(cmd.Cmd):
     query.query = args
     query.configuration = self.__options_to_string_list()
     print "Explain query: %s" % (query.query,)
-    (explanation, status) = self.__do_rpc(lambda: self.imp_service.explain(query))
+    (explanation, status) = self.__do_rpc(self.rpc_explain, query)
     if status != RpcStatus.OK:
       return False
 
@@ -487,7 +630,7 @@ class ImpalaShell(cmd.Cmd):
 
   def do_refresh(self, args):
     """Reload the Impalad catalog"""
-    (_, status) = self.__do_rpc(lambda: self.imp_service.ResetCatalog())
+    (_, status) = self.__do_rpc(self.rpc_reset_catalog)
     if status != RpcStatus.OK:
       return False
 
@@ -505,13 +648,21 @@ class ImpalaShell(cmd.Cmd):
       print 'readline module not found, history is not supported.'
     return True
 
+  def __load_history(self):
+    """Load the history file if it exists. Runs in history_thread; errors are
+    reported by preloop()."""
+    try:
+      self.readline.read_history_file(self.history_file)
+    except IOError, i:
+      self.history_error = i
+
   def preloop(self):
-    """Load the history file if it exists"""
-    if self.readline:
-      try:
-        self.readline.read_history_file(self.history_file)
-      except IOError, i:
-        print 'Unable to load history: %s' % i
+    """Wait for the history file to be loaded"""
+    if self.history_thread:
+      self.history_thread.join()
+      self.history_thread = None
+      if self.history_error:
+        print 'Unable to load history: %s' % self.history_error
 
   def postloop(self):
     """Save session commands in history."""
@@ -553,6 +704,44 @@ def parse_query_text(query_text):
   The semi-colon takes precedence over everything else. As such,
   it's not permitted within a comment, and cannot be escaped.
   """
+  queries = split_queries(query_text)
+  # The last query need not be demilited by a semi-colon.
+  # If it is, get rid of the last element.
+  if len(queries[-1]) == 0:
+    queries = queries[:-1]
+  return queries
+
+def parse_query_chunks(chunks):
+  """Generator version of parse_query_text() over an iterable of text chunks.
+
+  Each query is yielded as soon as its terminating semi-colon has been read, so
+  the caller can start executing it before the rest of the text is parsed.
+  """
+  # Each chunk is cut after its last semi-colon, and the rest is carried over to
+  # the next chunk. Comments end at a semi-colon, so the complete queries before
+  # the cut can be parsed on their own.
+  pending = []
+  for chunk in chunks:
+    cut = chunk.rfind(';') + 1
+    if cut == 0:
+      # No query ends in this chunk
+      pending.append(chunk)
+      continue
+    pending.append(chunk[:cut])
+    text = ''.join(pending)
+    pending = [chunk[cut:]]
+    # The text ends with a semi-colon, so its last element is always empty.
+    for query in split_queries(text)[:-1]:
+      yield query
+  # The last query need not be delimited by a semi-colon.
+  # If it is, it's empty and is dropped.
+  query = split_queries(''.join(pending))[0]
+  if len(query) > 0:
+    yield query
+
+def split_queries(query_text):
+  """Splits query_text on semi-colons into queries with their comments and blank
+  lines removed. An empty query is returned for a trailing semi-colon."""
   # queries are split by a semi-colon.
   raw_queries = query_text.split(';')
   queries = []
@@ -564,23 +753,34 @@ def parse_query_text(query_text):
         # anything before the comment is legal.
         query.append(line)
     queries.append('\n'.join(query))
-  # The last query need not be demilited by a semi-colon.
-  # If it is, get rid of the last element.
-  if len(queries[-1]) == 0:
-    queries = queries[:-1]
   return queries
 
+def read_query_file(query_file_handle):
+  """Generator that reads the query file in chunks of QUERY_FILE_CHUNK_SIZE bytes,
+  and closes it once it's exhausted."""
+  try:
+    while True:
+      chunk = query_file_handle.read(QUERY_FILE_CHUNK_SIZE)
+      if not chunk:
+        break
+      yield chunk
+  except IOError, e:
+    print 'Error: %s' % e
+    sys.exit(1)
+  finally:
+    query_file_handle.close()
+
 def execute_queries_non_interactive_mode(options):
   """Run queries in non-interactive mode."""
   queries = []
   if options.query_file:
     try:
       query_file_handle = open(options.query_file, 'r')
-      queries = parse_query_text(query_file_handle.read())
-      query_file_handle.close()
     except Exception, e:
       print 'Error: %s' % e
       sys.exit(1)
+    # Queries are parsed as the file is read, and executed as soon as they are parsed.
+    queries = parse_query_chunks(read_query_file(query_file_handle))
   elif options.query:
     queries = [options.query]
   shell = ImpalaShell(options)
@@ -588,10 +788,9 @@ def execute_queries_non_interactive_mode(options):
   # Return with an error, no need to process the query.
   if options.impalad and shell.connected == False:
     sys.exit(1)
-  queries = shell.cmdqueue + queries
-  # Deal with case.
-  queries = map(shell.sanitise_input, queries)
-  for query in queries:
+  for query in itertools.chain(list(shell.cmdqueue), queries):
+    # Deal with case.
+    query = shell.sanitise_input(query)
     if not shell.onecmd(query):
       print 'Could not execute command: %s' % query
       if not options.ignore_query_failure:
@@ -643,6 +842,7 @@ if __name__ == "__main__":
         print 'Neither saslwrapper nor sasl module found'
         sys.exit(1)
     from thrift_sasl import TSaslClientTransport
+    SaslClient = sasl.Client
 
     # The service name defaults to 'impala' if not specified by the user.
     if not options.kerberos_service_name:
@@ -656,7 +856,7 @@ if __name__ == "__main__":
     sys.exit(0)
 
   intro = WELCOME_STRING
-  shell = ImpalaShell(options)
+  shell = ImpalaShell(options, interactive=True)
   while shell.is_alive:
     try:
       shell.cmdloop(intro)